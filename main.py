@@ -1,16 +1,38 @@
+import base64
 import json
 import boto3
+from boto3.dynamodb.types import TypeSerializer
 import os
-import uuid
+import secrets
 from datetime import datetime, timezone
-from urllib.parse import urlencode
+from decimal import Decimal
+from urllib.parse import urlencode, quote
 import urllib3
-from botocore.exceptions import ClientError, BotoCoreError
+from botocore.auth import S3SigV4QueryAuth
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+from botocore.exceptions import ClientError, BotoCoreError, ParamValidationError
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
-bedrock_client = boto3.client('bedrock-runtime')
+# Prefer orjson for (de)serialization; fall back to stdlib json when unavailable.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing handlers still apply.
+def json_default(obj):
+    """Encode types JSON doesn't know; DynamoDB numbers arrive as Decimal"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    return str(obj)
+
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj, default=json_default).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj, default=json_default)
+
+    json_loads = json.loads
 
 # Environment variables
 PROFILES_TABLE = os.environ.get('PROFILES_TABLE')
@@ -19,6 +41,105 @@ FITS_TABLE = os.environ.get('FITS_TABLE')
 ASSETS_BUCKET = os.environ.get('ASSETS_BUCKET')
 COGNITO_DOMAIN = os.environ.get('COGNITO_DOMAIN')
 COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
+COGNITO_TOKEN_URL = f"https://{COGNITO_DOMAIN}/oauth2/token"
+
+# Request validation constants
+VALID_IMAGE_TYPES = frozenset(('face', 'body', 'other'))
+VALID_FIT_MODES = frozenset(('MVP_COMPOSITE', 'BEDROCK'))
+# Required profile measurements as (field, exclusive min, inclusive max)
+PROFILE_SCHEMA = (
+    ('height_cm', 50, 300),
+    ('weight_kg', 10, 300),
+    ('chest_cm', 30, 250),
+    ('waist_cm', 30, 250),
+    ('hips_cm', 30, 250),
+    ('inseam_cm', 20, 150)
+)
+CART_REQUIRED_FIELDS = ('retailer', 'productId', 'title', 'price_cents', 'currency',
+                        'productUrl', 'imageUrl', 'selectedSize', 'color', 'category')
+TOKEN_REQUIRED_FIELDS = ('code', 'redirectUri', 'codeVerifier')
+
+# Attributes a client may request from GET /cart via ?fields=
+CART_ITEM_FIELDS = (
+    'item_key', 'retailer', 'productId', 'title', 'price_cents', 'currency',
+    'productUrl', 'imageUrl', 'selectedSize', 'color', 'category', 'addedAt', 'updatedAt'
+)
+
+# Upsert for a cart item; addedAt is only set the first time the item is saved
+CART_UPDATE_EXPRESSION = (
+    "SET retailer = :r, productId = :pid, title = :t, price_cents = :p, "
+    "currency = :c, productUrl = :pu, imageUrl = :iu, "
+    "selectedSize = :ss, color = :col, category = :cat, "
+    "updatedAt = :ts, addedAt = if_not_exists(addedAt, :ts)"
+)
+
+# Shared client config: keep connections alive across warm invocations
+boto_config = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={'max_attempts': 3, 'mode': 'standard'}
+)
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb', config=boto_config)
+dynamodb_client = boto3.client('dynamodb', config=boto_config)
+s3_client = boto3.client('s3', config=boto_config)
+bedrock_client = None  # created on first use, see get_bedrock_client()
+
+# Presigned GET URLs are signed directly with SigV4, skipping the client's
+# request-serialization stack (signing is purely local, no network call)
+PRESIGNED_GET_EXPIRES = 3600  # 1 hour
+s3_region = s3_client.meta.region_name
+# Dotted bucket names don't match the S3 wildcard certificate, so (like boto3) use path style
+if not ASSETS_BUCKET:
+    s3_bucket_url = None
+elif '.' in ASSETS_BUCKET:
+    s3_bucket_url = f"https://s3.{s3_region}.amazonaws.com/{ASSETS_BUCKET}"
+else:
+    s3_bucket_url = f"https://{ASSETS_BUCKET}.s3.{s3_region}.amazonaws.com"
+s3_get_signer = S3SigV4QueryAuth(
+    boto3.Session().get_credentials(), 's3', s3_region, expires=PRESIGNED_GET_EXPIRES
+)
+
+# Low-level writes on hot paths take pre-marshalled AttributeValues
+type_serializer = TypeSerializer()
+
+# DynamoDB tables (created once per container, during cold start).
+# An unset table name leaves its table as None so routes that don't use it still load.
+def load_table(env_name, table_name):
+    """Return the DynamoDB Table for table_name, or None if its env var is unset"""
+    if not table_name:
+        print(f"CONFIG WARNING: {env_name} is not set; routes using it will fail")
+        return None
+    return dynamodb.Table(table_name)
+
+profiles_table = load_table('PROFILES_TABLE', PROFILES_TABLE)
+cart_items_table = load_table('CART_ITEMS_TABLE', CART_ITEMS_TABLE)
+fits_table = load_table('FITS_TABLE', FITS_TABLE)
+
+# HTTP pool for Cognito calls, reused across warm invocations
+http = urllib3.PoolManager(
+    num_pools=4,
+    maxsize=20,
+    block=False,
+    retries=urllib3.Retry(total=2, backoff_factor=0.1),
+    timeout=urllib3.Timeout(connect=2.0, read=5.0)
+)
+
+# Fixed part of the token exchange form body and request headers
+COGNITO_TOKEN_FORM_PREFIX = urlencode({
+    'grant_type': 'authorization_code',
+    'client_id': COGNITO_CLIENT_ID
+})
+COGNITO_TOKEN_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+# Default response headers (shared, never mutated)
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
 
 # Shared utilities
 def get_user_id(event):
@@ -30,19 +151,14 @@ def get_user_id(event):
 
 def create_response(status_code, body, headers=None):
     """Create standardized API Gateway response"""
-    default_headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-    }
+    response_headers = DEFAULT_HEADERS
     if headers:
-        default_headers.update(headers)
+        response_headers = {**DEFAULT_HEADERS, **headers}
     
     return {
         'statusCode': status_code,
-        'headers': default_headers,
-        'body': json.dumps(body)
+        'headers': response_headers,
+        'body': json_dumps(body)
     }
 
 def create_error_response(status_code, error_type, message, details=None):
@@ -56,6 +172,43 @@ def create_error_response(status_code, error_type, message, details=None):
     
     return create_response(status_code, error_body)
 
+# Prebuilt responses for common fixed replies
+OPTIONS_RESPONSE = {'statusCode': 204, 'headers': DEFAULT_HEADERS, 'body': ''} # preflight has no body
+NOT_FOUND_RESPONSE = create_error_response(404, 'NOT_FOUND', 'The requested resource was not found')
+INTERNAL_ERROR_RESPONSE = create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+
+def get_bedrock_client():
+    """Return the Bedrock runtime client, creating it on first use"""
+    global bedrock_client
+    if bedrock_client is None:
+        bedrock_client = boto3.client('bedrock-runtime', config=boto_config)
+    return bedrock_client
+
+def serialize_item(item):
+    """Marshal a plain dict into DynamoDB AttributeValue format"""
+    return {key: type_serializer.serialize(value) for key, value in item.items()}
+
+def put_new_fit(fit_data):
+    """Write a new fit record once; a replayed write of the same fitId is a no-op"""
+    try:
+        dynamodb_client.put_item(
+            TableName=FITS_TABLE,
+            Item=serialize_item(fit_data),
+            ConditionExpression='attribute_not_exists(fitId)'
+        )
+    except ClientError as e:
+        # A retried request whose first attempt already landed
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def generate_presigned_get_url(key):
+    """Generate a presigned S3 GET URL for an object in the assets bucket"""
+    if s3_bucket_url is None:
+        raise ParamValidationError(report='ASSETS_BUCKET is not set')
+    request = AWSRequest(method='GET', url=f"{s3_bucket_url}/{quote(key, safe='/~')}")
+    s3_get_signer.add_auth(request)
+    return request.url
+
 def get_current_timestamp():
     """Get current ISO 8601 timestamp"""
     return datetime.now(timezone.utc).isoformat()
@@ -71,12 +224,12 @@ def upload_url_handler(event, context):
         query_params = event.get('queryStringParameters') or {}
         image_type = query_params.get('type')
         
-        if not image_type or image_type not in ['face', 'body', 'other']:
+        if not image_type or image_type not in VALID_IMAGE_TYPES:
             return create_error_response(400, 'INVALID_PARAMETER', 
                                        'type parameter must be one of: face, body, other')
         
         # Generate unique S3 object key
-        unique_id = str(uuid.uuid4())
+        unique_id = secrets.token_urlsafe(16)
         object_key = f"uploads/{user_id}/{image_type}/{unique_id}.jpg"
         
         # Generate presigned URL with conditions
@@ -104,7 +257,7 @@ def upload_url_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'S3_ERROR', 'Failed to generate upload URL')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
 
 # 2. POST /profile - Create or update user profile
 def profile_handler(event, context):
@@ -115,20 +268,21 @@ def profile_handler(event, context):
         
         # Parse request body
         try:
-            body = json.loads(event['body'])
+            body = json_loads(event['body'])
         except (json.JSONDecodeError, TypeError):
             return create_error_response(400, 'INVALID_JSON', 'Request body must be valid JSON')
         
         # Validate required numeric fields
-        required_fields = ['height_cm', 'weight_kg', 'chest_cm', 'waist_cm', 'hips_cm', 'inseam_cm']
-        for field in required_fields:
+        for field, min_value, max_value in PROFILE_SCHEMA:
             if field not in body:
                 return create_error_response(400, 'MISSING_FIELD', f'Required field missing: {field}')
             
+            # Exact type check: rejects bools and skips the isinstance() MRO walk
             value = body[field]
-            if not isinstance(value, (int, float)) or value <= 0 or value > 300:
+            value_type = type(value)
+            if (value_type is not int and value_type is not float) or not min_value < value <= max_value:
                 return create_error_response(400, 'INVALID_VALUE', 
-                                           f'{field} must be a positive number less than 300')
+                                           f'{field} must be a number greater than {min_value} and at most {max_value}')
         
         # Validate preferred_fit
         if 'preferred_fit' not in body:
@@ -152,8 +306,7 @@ def profile_handler(event, context):
             profile_data['avatar_key'] = body['avatar_key']
         
         # Store in DynamoDB
-        table = dynamodb.Table(PROFILES_TABLE)
-        table.put_item(Item=profile_data)
+        profiles_table.put_item(Item=profile_data)
         
         return create_response(200, {
             'ok': True,
@@ -165,7 +318,7 @@ def profile_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to save profile')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
 
 # 3. POST /cart - Add or update cart item
 def cart_post_handler(event, context):
@@ -176,52 +329,46 @@ def cart_post_handler(event, context):
         
         # Parse request body
         try:
-            body = json.loads(event['body'])
+            body = json_loads(event['body'])
         except (json.JSONDecodeError, TypeError):
             return create_error_response(400, 'INVALID_JSON', 'Request body must be valid JSON')
         
         # Validate required fields
-        required_fields = ['retailer', 'productId', 'title', 'price_cents', 'currency', 
-                          'productUrl', 'imageUrl', 'selectedSize', 'color', 'category']
-        
-        for field in required_fields:
+        for field in CART_REQUIRED_FIELDS:
             if field not in body:
                 return create_error_response(400, 'MISSING_FIELD', f'Required field missing: {field}')
         
         # Validate price_cents is numeric
-        if not isinstance(body['price_cents'], (int, float)) or body['price_cents'] < 0:
+        # Exact type check so JSON booleans aren't accepted (they can't be marshalled as N)
+        price_type = type(body['price_cents'])
+        if (price_type is not int and price_type is not float) or body['price_cents'] < 0:
             return create_error_response(400, 'INVALID_VALUE', 'price_cents must be a non-negative number')
         
         # Create composite sort key
         item_key = f"{body['retailer']}#{body['productId']}"
         current_time = get_current_timestamp()
         
-        table = dynamodb.Table(CART_ITEMS_TABLE)
-        
-        # Use UpdateItem for more precise control
-        table.update_item(
+        # Use UpdateItem for more precise control (low-level client, values pre-marshalled)
+        serialize = type_serializer.serialize
+        dynamodb_client.update_item(
+            TableName=CART_ITEMS_TABLE,
             Key={
-                'user_id': user_id,
-                'item_key': item_key
+                'user_id': {'S': user_id},
+                'item_key': {'S': item_key}
             },
-            UpdateExpression="SET "
-                "retailer = :r, productId = :pid, title = :t, price_cents = :p, "
-                "currency = :c, productUrl = :pu, imageUrl = :iu, "
-                "selectedSize = :ss, color = :col, category = :cat, "
-                "updatedAt = :ts, "
-                "addedAt = if_not_exists(addedAt, :ts)", # This is the magic line
+            UpdateExpression=CART_UPDATE_EXPRESSION,
             ExpressionAttributeValues={
-                ':r': body['retailer'],
-                ':pid': body['productId'],
-                ':t': body['title'],
-                ':p': body['price_cents'],
-                ':c': body['currency'],
-                ':pu': body['productUrl'],
-                ':iu': body['imageUrl'],
-                ':ss': body['selectedSize'],
-                ':col': body['color'],
-                ':cat': body['category'],
-                ':ts': current_time # Use the same timestamp for updatedAt and addedAt
+                ':r': serialize(body['retailer']),
+                ':pid': serialize(body['productId']),
+                ':t': serialize(body['title']),
+                ':p': {'N': str(body['price_cents'])},
+                ':c': serialize(body['currency']),
+                ':pu': serialize(body['productUrl']),
+                ':iu': serialize(body['imageUrl']),
+                ':ss': serialize(body['selectedSize']),
+                ':col': serialize(body['color']),
+                ':cat': serialize(body['category']),
+                ':ts': {'S': current_time} # Use the same timestamp for updatedAt and addedAt
             }
         )
         
@@ -232,7 +379,7 @@ def cart_post_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to save cart item')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
 
 # 4. GET /cart - List user's cart items
 def cart_get_handler(event, context):
@@ -251,19 +398,31 @@ def cart_get_handler(event, context):
             'ExpressionAttributeValues': {':user_id': user_id}
         }
         
+        # Optional sparse fieldset, e.g. ?fields=title,price_cents,imageUrl
+        fields = query_params.get('fields')
+        if fields:
+            # Deduplicate: DynamoDB rejects overlapping paths in a projection
+            requested = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+            invalid = [f for f in requested if f not in CART_ITEM_FIELDS]
+            if not requested or invalid:
+                return create_error_response(400, 'INVALID_PARAMETER',
+                                           'fields must be a comma-separated list of: '
+                                           + ', '.join(CART_ITEM_FIELDS))
+            names = {f'#f{i}': field for i, field in enumerate(requested)}
+            query_kwargs['ProjectionExpression'] = ', '.join(names)
+            query_kwargs['ExpressionAttributeNames'] = names
+        
         # Add pagination if cursor provided
         if cursor:
             try:
                 # Decode cursor (in real implementation, you'd want to encrypt/sign this)
-                import base64
-                decoded_cursor = json.loads(base64.b64decode(cursor).decode())
+                decoded_cursor = json_loads(base64.b64decode(cursor))
                 query_kwargs['ExclusiveStartKey'] = decoded_cursor
             except Exception:
                 return create_error_response(400, 'INVALID_CURSOR', 'Invalid pagination cursor')
         
         # Query DynamoDB
-        table = dynamodb.Table(CART_ITEMS_TABLE)
-        response = table.query(**query_kwargs)
+        response = cart_items_table.query(**query_kwargs)
         
         # Prepare response
         items = response.get('Items', [])
@@ -271,8 +430,7 @@ def cart_get_handler(event, context):
         
         if 'LastEvaluatedKey' in response:
             # Encode cursor for next page
-            import base64
-            cursor_data = base64.b64encode(json.dumps(response['LastEvaluatedKey']).encode()).decode()
+            cursor_data = base64.b64encode(json_dumps(response['LastEvaluatedKey']).encode()).decode()
             next_cursor = cursor_data
         
         return create_response(200, {
@@ -285,7 +443,7 @@ def cart_get_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to retrieve cart items')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')# 5. POST /f
+        return INTERNAL_ERROR_RESPONSE# 5. POST /f
 #it - Create new fit generation job
 def fit_create_handler(event, context):
     """Create a new fit generation job from selected items"""
@@ -295,7 +453,7 @@ def fit_create_handler(event, context):
         
         # Parse request body
         try:
-            body = json.loads(event['body'])
+            body = json_loads(event['body'])
         except (json.JSONDecodeError, TypeError):
             return create_error_response(400, 'INVALID_JSON', 'Request body must be valid JSON')
         
@@ -303,7 +461,8 @@ def fit_create_handler(event, context):
         if 'items' not in body or not isinstance(body['items'], list):
             return create_error_response(400, 'MISSING_FIELD', 'items array is required')
         
-        if 'mode' not in body or body['mode'] not in ['MVP_COMPOSITE', 'BEDROCK']:
+        # Type check first: unhashable JSON values (lists, objects) can't be looked up in a set
+        if not isinstance(body.get('mode'), str) or body['mode'] not in VALID_FIT_MODES:
             return create_error_response(400, 'INVALID_MODE', 'mode must be MVP_COMPOSITE or BEDROCK')
         
         # Validate items array
@@ -313,7 +472,8 @@ def fit_create_handler(event, context):
                                            'Each item must have retailer and productId')
         
         # Generate unique fit ID
-        fit_id = str(uuid.uuid4())
+        fit_id = secrets.token_urlsafe(16)
+        current_time = get_current_timestamp()
         
         # Prepare fit data
         fit_data = {
@@ -322,8 +482,8 @@ def fit_create_handler(event, context):
             'items': body['items'],
             'mode': body['mode'],
             'status': 'PENDING',
-            'createdAt': get_current_timestamp(),
-            'updatedAt': get_current_timestamp()
+            'createdAt': current_time,
+            'updatedAt': current_time
         }
         
         # Add optional fields
@@ -332,21 +492,19 @@ def fit_create_handler(event, context):
         if 'body_asset_key' in body:
             fit_data['body_asset_key'] = body['body_asset_key']
         
-        # Store initial record in DynamoDB
-        table = dynamodb.Table(FITS_TABLE)
-        table.put_item(Item=fit_data)
-        
         # Handle different modes
         if body['mode'] == 'BEDROCK':
-            # For Bedrock mode, just return PENDING status
+            # For Bedrock mode, store PENDING record and return
             # Actual processing would be handled by separate async process
+            put_new_fit(fit_data)
             return create_response(201, {
                 'fitId': fit_id,
                 'status': 'PENDING'
             })
         
         elif body['mode'] == 'MVP_COMPOSITE':
-            # For MVP mode, perform simple synchronous processing
+            # For MVP mode, perform simple synchronous processing and write the
+            # final record in a single put_item
             try:
                 # Skeleton implementation for MVP composite
                 # In real implementation, you'd use PIL/Pillow for image compositing
@@ -356,42 +514,27 @@ def fit_create_handler(event, context):
                 # composite_image = create_composite_image(body['items'], body.get('body_asset_key'))
                 # s3_client.put_object(Bucket=ASSETS_BUCKET, Key=generated_key, Body=composite_image)
                 
-                # Update fit record with READY status
-                table.update_item(
-                    Key={'fitId': fit_id},
-                    UpdateExpression='SET #status = :status, imageUrl = :imageUrl, updatedAt = :updatedAt',
-                    ExpressionAttributeNames={'#status': 'status'},
-                    ExpressionAttributeValues={
-                        ':status': 'READY',
-                        ':imageUrl': generated_key,
-                        ':updatedAt': get_current_timestamp()
-                    }
-                )
-                
-                return create_response(201, {
-                    'fitId': fit_id,
-                    'status': 'READY'
-                })
+                fit_data['status'] = 'READY'
+                fit_data['imageUrl'] = generated_key
                 
             except Exception as e:
-                # Update fit record with FAILED status
-                table.update_item(
-                    Key={'fitId': fit_id},
-                    UpdateExpression='SET #status = :status, updatedAt = :updatedAt',
-                    ExpressionAttributeNames={'#status': 'status'},
-                    ExpressionAttributeValues={
-                        ':status': 'FAILED',
-                        ':updatedAt': get_current_timestamp()
-                    }
-                )
+                # Store fit record with FAILED status
+                fit_data['status'] = 'FAILED'
+                put_new_fit(fit_data)
                 return create_error_response(500, 'GENERATION_FAILED', 'Failed to generate fit')
+            
+            put_new_fit(fit_data)
+            return create_response(201, {
+                'fitId': fit_id,
+                'status': 'READY'
+            })
         
     except ValueError as e:
         return create_error_response(401, 'UNAUTHORIZED', str(e))
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to create fit job')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
 
 # 6. GET /fit/{fitId} - Retrieve fit status and image
 def fit_get_handler(event, context):
@@ -406,8 +549,11 @@ def fit_get_handler(event, context):
             return create_error_response(400, 'MISSING_PARAMETER', 'fitId is required')
         
         # Fetch fit from DynamoDB
-        table = dynamodb.Table(FITS_TABLE)
-        response = table.get_item(Key={'fitId': fit_id})
+        response = fits_table.get_item(
+            Key={'fitId': fit_id},
+            ProjectionExpression='fitId, user_id, #status, #items, createdAt, updatedAt, #name, imageUrl',
+            ExpressionAttributeNames={'#status': 'status', '#items': 'items', '#name': 'name'}
+        )
         
         if 'Item' not in response:
             return create_error_response(404, 'FIT_NOT_FOUND', 'Fit not found')
@@ -432,21 +578,16 @@ def fit_get_handler(event, context):
         if 'name' in fit_item:
             response_data['name'] = fit_item['name']
         
-        # Generate presigned URL if fit is ready
-        if fit_item['status'] == 'READY' and 'imageUrl' in fit_item:
-            try:
-                presigned_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': ASSETS_BUCKET,
-                        'Key': fit_item['imageUrl']
-                    },
-                    ExpiresIn=3600  # 1 hour
-                )
-                response_data['imageUrl'] = presigned_url
-            except ClientError:
-                # If presigned URL generation fails, continue without it
-                pass
+        # Only ready fits have an image to link
+        if fit_item['status'] != 'READY' or 'imageUrl' not in fit_item:
+            return create_response(200, response_data)
+        
+        # Generate presigned URL (signed locally, no network call)
+        try:
+            response_data['imageUrl'] = generate_presigned_get_url(fit_item['imageUrl'])
+        except BotoCoreError:
+            # If presigned URL generation fails, continue without it
+            pass
         
         return create_response(200, response_data)
         
@@ -455,7 +596,34 @@ def fit_get_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to retrieve fit')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
+
+# Helper for GET /fits: summary row plus presigned thumbnail URL
+def build_fit_summary(item):
+    """Build a fit list entry, signing a thumbnail URL for ready fits"""
+    fit_summary = {
+        'fitId': item['fitId'],
+        'createdAt': item['createdAt'],
+        'status': item['status'],
+        'thumbnailUrl': None
+    }
+    
+    # Add optional name
+    if 'name' in item:
+        fit_summary['name'] = item['name']
+    
+    # Generate thumbnail URL for ready fits
+    if item['status'] == 'READY' and 'imageUrl' in item:
+        try:
+            # Assume thumbnail exists with _thumb suffix
+            thumbnail_key = item['imageUrl'].replace('.jpg', '_thumb.jpg')
+            thumbnail_url = generate_presigned_get_url(thumbnail_key)
+            fit_summary['thumbnailUrl'] = thumbnail_url
+        except BotoCoreError:
+            # If thumbnail doesn't exist or fails, continue without it
+            pass
+    
+    return fit_summary
 
 # 7. GET /fits - List recent fits for user
 def fits_list_handler(event, context):
@@ -466,14 +634,14 @@ def fits_list_handler(event, context):
         
         # Query fits table using GSI on user_id
         # Note: This assumes a GSI exists with user_id as partition key and createdAt as sort key
-        table = dynamodb.Table(FITS_TABLE)
-        
         # For this implementation, we'll scan and filter (not optimal for production)
         # In production, use a GSI with user_id as partition key
-        response = table.query(
+        response = fits_table.query(
             IndexName='UserFitsByDate-Index', # The GSI you created
             KeyConditionExpression='user_id = :user_id',
             ExpressionAttributeValues={':user_id': user_id},
+            ProjectionExpression='fitId, createdAt, #status, imageUrl, #name',
+            ExpressionAttributeNames={'#status': 'status', '#name': 'name'},
             ScanIndexForward=False, # Sorts by createdAt (newest first)
             Limit=20
         )
@@ -484,38 +652,8 @@ def fits_list_handler(event, context):
         #     Limit=20
         # )
         
-        fits = []
-        for item in response.get('Items', []):
-            fit_summary = {
-                'fitId': item['fitId'],
-                'createdAt': item['createdAt'],
-                'status': item['status'],
-                'thumbnailUrl': None
-            }
-            
-            # Add optional name
-            if 'name' in item:
-                fit_summary['name'] = item['name']
-            
-            # Generate thumbnail URL for ready fits
-            if item['status'] == 'READY' and 'imageUrl' in item:
-                try:
-                    # Assume thumbnail exists with _thumb suffix
-                    thumbnail_key = item['imageUrl'].replace('.jpg', '_thumb.jpg')
-                    thumbnail_url = s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={
-                            'Bucket': ASSETS_BUCKET,
-                            'Key': thumbnail_key
-                        },
-                        ExpiresIn=3600  # 1 hour
-                    )
-                    fit_summary['thumbnailUrl'] = thumbnail_url
-                except ClientError:
-                    # If thumbnail doesn't exist or fails, continue without it
-                    pass
-            
-            fits.append(fit_summary)
+        # Build summaries in query order (newest first)
+        fits = [build_fit_summary(item) for item in response.get('Items', [])]
         
         # Sort by createdAt descending (most recent first)
         #fits.sort(key=lambda x: x['createdAt'], reverse=True)
@@ -527,7 +665,7 @@ def fits_list_handler(event, context):
     except ClientError as e:
         return create_error_response(500, 'DYNAMODB_ERROR', 'Failed to retrieve fits')
     except Exception as e:
-        return create_error_response(500, 'INTERNAL_ERROR', 'An unexpected error occurred')
+        return INTERNAL_ERROR_RESPONSE
 
 # 8. POST /token - Exchange authorization code for tokens
 def token_handler(event, context):
@@ -535,48 +673,42 @@ def token_handler(event, context):
     try:
         # Parse request body
         try:
-            body = json.loads(event['body'])
+            body = json_loads(event['body'])
         except (json.JSONDecodeError, TypeError):
             return create_error_response(400, 'INVALID_JSON', 'Request body must be valid JSON')
         
         # Validate required fields
-        required_fields = ['code', 'redirectUri', 'codeVerifier']
-        for field in required_fields:
+        for field in TOKEN_REQUIRED_FIELDS:
             if field not in body:
                 return create_error_response(400, 'MISSING_FIELD', f'Required field missing: {field}')
         
-        # Prepare token exchange request
-        token_data = {
-            'grant_type': 'authorization_code',
-            'client_id': COGNITO_CLIENT_ID,
+        # Prepare token exchange request (only the per-request fields are encoded here)
+        encoded_data = COGNITO_TOKEN_FORM_PREFIX + '&' + urlencode({
             'code': body['code'],
             'redirect_uri': body['redirectUri'],
             'code_verifier': body['codeVerifier']
-        }
+        })
         
         # Make request to Cognito token endpoint
-        http = urllib3.PoolManager()
-        
-        token_url = f"https://{COGNITO_DOMAIN}/oauth2/token"
-        encoded_data = urlencode(token_data)
-        
         response = http.request(
             'POST',
-            token_url,
+            COGNITO_TOKEN_URL,
             body=encoded_data,
-            headers={
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
+            headers=COGNITO_TOKEN_HEADERS
         )
         
-        # Parse Cognito response
-        response_data = json.loads(response.data.decode('utf-8'))
+        # Trust Cognito's Content-Type: a JSON body is passed through without re-encoding
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return {
+                'statusCode': response.status,
+                'headers': DEFAULT_HEADERS,
+                'body': response.data.decode('utf-8')
+            }
         
-        # Return Cognito response with appropriate status code
-        if response.status == 200:
-            return create_response(200, response_data)
-        else:
-            return create_response(response.status, response_data)
+        # Otherwise parse and rewrap, so non-JSON bodies surface as COGNITO_ERROR
+        response_data = json_loads(response.data)
+        return create_response(response.status, response_data)
         
     except json.JSONDecodeError:
         return create_error_response(500, 'COGNITO_ERROR', 'Invalid response from Cognito')
@@ -585,46 +717,37 @@ def token_handler(event, context):
 
 # --- MAIN LAMBDA ROUTER ---
 
+# --- Define Your Routes ---
+# Keyed by (resource, method), e.g. ('/fit/{fitId}', 'GET')
+ROUTES = {
+    ('/upload-url', 'GET'): upload_url_handler,
+    ('/profile', 'POST'): profile_handler,
+    ('/cart', 'POST'): cart_post_handler,
+    ('/cart', 'GET'): cart_get_handler,
+    ('/fit', 'POST'): fit_create_handler,
+    ('/fit/{fitId}', 'GET'): fit_get_handler,
+    ('/fits', 'GET'): fits_list_handler,
+    ('/token', 'POST'): token_handler,
+}
+
 def lambda_handler(event, context):
     """
     Main entry point for API Gateway.
     Routes requests to the correct handler based on method and path.
     """
+    # Handle CORS pre-flight OPTIONS requests before any other work
+    if event.get('httpMethod') == 'OPTIONS':
+        return OPTIONS_RESPONSE # 204 No Content is common for OPTIONS
+
     try:
         method = event['httpMethod']
         resource = event['resource'] # e.g., /profile, /fit/{fitId}
 
-        # Handle CORS pre-flight OPTIONS requests
-        if method == 'OPTIONS':
-            return create_response(204, {}) # 204 No Content is common for OPTIONS
+        handler = ROUTES.get((resource, method))
+        if handler is None:
+            return NOT_FOUND_RESPONSE
 
-        # --- Define Your Routes ---
-        if resource == '/upload-url' and method == 'GET':
-            return upload_url_handler(event, context)
-            
-        elif resource == '/profile' and method == 'POST':
-            return profile_handler(event, context)
-            
-        elif resource == '/cart' and method == 'POST':
-            return cart_post_handler(event, context)
-            
-        elif resource == '/cart' and method == 'GET':
-            return cart_get_handler(event, context)
-            
-        elif resource == '/fit' and method == 'POST':
-            return fit_create_handler(event, context)
-            
-        elif resource == '/fit/{fitId}' and method == 'GET':
-            return fit_get_handler(event, context)
-            
-        elif resource == '/fits' and method == 'GET':
-            return fits_list_handler(event, context)
-            
-        elif resource == '/token' and method == 'POST':
-            return token_handler(event, context)
-            
-        else:
-            return create_error_response(404, 'NOT_FOUND', 'The requested resource was not found')
+        return handler(event, context)
 
     except Exception as e:
         # Catch-all for any unhandled exceptions